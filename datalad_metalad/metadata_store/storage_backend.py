@@ -0,0 +1,555 @@
+"""
+Storage backends for metadata stores.
+
+A storage backend keeps the metadata content of all paths in a
+single storage entity, e.g. a file. Content is appended, or
+rewritten in place within a previously used region; the index layer
+keeps track of the regions, i.e. offset and size, in which the
+content of the individual entries is stored.
+"""
+from typing import Iterator, List, Optional, Tuple, Union
+
+import bisect
+import mmap
+import os
+import threading
+from collections import deque
+
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+
+# writev accepts at most IOV_MAX buffers per call, 1024 is the
+# portable lower bound
+_IOV_MAX = 1024
+
+
+def _write_all(file_descriptor: int, buffer) -> None:
+    view = memoryview(buffer)
+    while view:
+        written = os.write(file_descriptor, view)
+        view = view[written:]
+
+
+if hasattr(os, "writev"):
+    def _writev_all(file_descriptor: int, buffers: List[bytes]) -> None:
+        for start in range(0, len(buffers), _IOV_MAX):
+            group = buffers[start:start + _IOV_MAX]
+            expected = sum(len(buffer) for buffer in group)
+            written = os.writev(file_descriptor, group)
+            if written == expected:
+                continue
+            # a partial write, finish the remainder buffer by buffer
+            for buffer in group:
+                if written >= len(buffer):
+                    written -= len(buffer)
+                    continue
+                _write_all(
+                    file_descriptor, memoryview(buffer)[written:])
+                written = 0
+else:
+    def _writev_all(file_descriptor: int, buffers: List[bytes]) -> None:
+        for buffer in buffers:
+            _write_all(file_descriptor, buffer)
+
+
+class StorageBackend:
+    """
+    Base class of all storage backends.
+
+    This is a plain class, not an ABC: backend methods are called
+    millions of times in bulk loads and the metaclass machinery of
+    abc adds avoidable dispatch overhead. Missing methods surface as
+    NotImplementedError on first use. All backends use __slots__, so
+    attribute access in the hot paths is a fixed slot offset instead
+    of an instance-dict lookup.
+    """
+    __slots__ = ("file_name",)
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+    def append_content(self, content: bytes) -> Tuple[int, int]:
+        """
+        Append content to the storage and return the offset
+        and the size of the stored content.
+        """
+        raise NotImplementedError
+
+    def read_content(self,
+                     offset: int,
+                     size: int) -> Union[bytes, memoryview]:
+        """
+        Read size bytes, beginning at offset, from the storage.
+
+        The result is a bytes-like object; backends that hold their
+        content in memory return a zero-copy memoryview into it, so
+        callers that need an independent bytes object have to convert
+        explicitly. The length of the returned content might be larger
+        than size, if the storage is compressed.
+        """
+        raise NotImplementedError
+
+    def byte_iterator(self, offset: int, size: int) -> Iterator[int]:
+        """
+        Get an iterator over the individual bytes of the content
+        that is stored at offset.
+        """
+        raise NotImplementedError
+
+    def write_content(self,
+                      offset: int,
+                      max_size: int,
+                      content: bytes) -> Optional[Tuple[int, int]]:
+        """
+        Overwrite a previously stored region in place.
+
+        If the stored form of content fits into max_size bytes at
+        offset, it is written there and the new region is returned;
+        otherwise None is returned and the caller has to append
+        instead. Zero-copy views that were handed out for the region
+        may observe the overwrite. The default refuses all in-place
+        writes.
+        """
+        return None
+
+    def flush(self):
+        """
+        Ensure that all appended content is persisted in the storage.
+        """
+        raise NotImplementedError
+
+    def advise_sequential(self):
+        """
+        Hint that the whole storage is about to be read from front
+        to back. Backends may use this to tune their read path; the
+        default does nothing.
+        """
+
+    def read_many(self,
+                  regions: List[Tuple[int, int]]) -> Iterator[bytes]:
+        """
+        Read multiple (offset, size) regions and yield their content
+        in the given order. Backends may override this to amortize
+        per-read costs; the default reads the regions one by one.
+        """
+        for offset, size in regions:
+            yield self.read_content(offset, size)
+
+    def append_many(self,
+                    contents: List[bytes]) -> List[Tuple[int, int]]:
+        """
+        Append multiple content objects and return their regions in
+        the given order. Backends may override this to coalesce the
+        appends; the default appends the contents one by one.
+        """
+        return [self.append_content(content) for content in contents]
+
+
+class DummyStorageBackend(StorageBackend):
+    """
+    A memory-only backend that is mainly used for testing.
+
+    Content is kept as a list of chunks instead of a single growing
+    bytearray. Appending a chunk is O(1) and never copies previously
+    stored content, and the footprint is the sum of the chunk sizes
+    without a growth reserve.
+    """
+    __slots__ = ("_chunks", "_chunk_offsets", "offset")
+
+    def __init__(self, file_name: str):
+        super().__init__(file_name)
+        self._chunks: List[bytes] = []
+        self._chunk_offsets: List[int] = []
+        self.offset = 0
+
+    def append_content(self, content: bytes) -> Tuple[int, int]:
+        offset = self.offset
+        self._chunks.append(bytes(content))
+        self._chunk_offsets.append(offset)
+        self.offset += len(content)
+        return offset, len(content)
+
+    def read_content(self,
+                     offset: int,
+                     size: int) -> Union[bytes, memoryview]:
+        index = bisect.bisect_right(self._chunk_offsets, offset) - 1
+        start = offset - self._chunk_offsets[index]
+        chunk = self._chunks[index]
+        if start + size <= len(chunk):
+            # the common case, a region inside one chunk, is served
+            # as a zero-copy view into the stored chunk
+            return memoryview(chunk)[start:start + size]
+        # the region spans chunk boundaries, collect the parts
+        parts = [chunk[start:]]
+        remaining = size - len(parts[0])
+        while remaining > 0:
+            index += 1
+            chunk = self._chunks[index]
+            parts.append(chunk[:remaining])
+            remaining -= len(parts[-1])
+        return b"".join(parts)
+
+    def byte_iterator(self, offset: int, size: int) -> Iterator[int]:
+        yield from self.read_content(offset, size)
+
+    def write_content(self,
+                      offset: int,
+                      max_size: int,
+                      content: bytes) -> Optional[Tuple[int, int]]:
+        size = len(content)
+        if size > max_size:
+            return None
+        index = bisect.bisect_right(self._chunk_offsets, offset) - 1
+        start = offset - self._chunk_offsets[index]
+        chunk = self._chunks[index]
+        if start + size > len(chunk):
+            # regions spanning chunk boundaries are not rewritten
+            return None
+        self._chunks[index] = b"".join(
+            (chunk[:start], bytes(content), chunk[start + size:]))
+        return offset, size
+
+    def flush(self):
+        pass
+
+
+class FileStorageBackend(StorageBackend):
+    """
+    A backend that appends all content to a single file.
+
+    Small appends are coalesced in a reusable buffer, large appends
+    are queued as-is without being copied. The pending buffers are
+    written out with one scatter-gather writev call when their total
+    size grows beyond soft_buffer_limit, before any read, and on
+    flush(). That turns many small per-append writes into few large
+    sequential ones without paying a coalescing copy for payloads
+    that are already large.
+
+    With deferred_flush=True the write-out itself is moved to a
+    daemon thread, so it overlaps with the work that produces the
+    appends; reads and flush() act as a synchronization barrier and
+    wait until the drain thread has caught up.
+
+    With compress=True every entry is stored LZ4-compressed behind a
+    one-byte tag, unless the compressed form is not smaller than the
+    raw content. Compression requires the optional lz4 package, and
+    a storage file written with compress=True has to be opened with
+    compress=True again.
+    """
+    __slots__ = ("file", "offset", "compress", "_buffer", "_pending",
+                 "_pending_size", "_mapped", "_flush_queue",
+                 "_flush_thread", "_queue_condition", "_in_flight",
+                 "_flush_error", "_write_fd")
+
+    soft_buffer_limit = 1024 * 1024
+    # payloads of at least this size skip the coalescing buffer and
+    # are written directly from their own buffer via writev
+    iovec_threshold = 64 * 1024
+    # number of regions whose pages are requested ahead of the
+    # consumer during bulk reads
+    prefetch_window = 256
+
+    def __init__(self,
+                 file_name: str,
+                 deferred_flush: bool = False,
+                 compress: bool = False):
+        super().__init__(file_name)
+        if compress and lz4frame is None:
+            raise ImportError(
+                "compressed storage requires the lz4 package")
+        self.compress = compress
+        self.file = open(file_name, "ab+")
+        self.offset = self.file.seek(0, os.SEEK_END)
+        self._buffer = bytearray()
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._mapped: Optional[mmap.mmap] = None
+        self._write_fd: Optional[int] = None
+        self._flush_queue: deque = deque()
+        self._queue_condition = threading.Condition()
+        self._in_flight = False
+        self._flush_error: Optional[Exception] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        if deferred_flush:
+            self._flush_thread = threading.Thread(
+                target=self._drain_loop, daemon=True)
+            self._flush_thread.start()
+
+    def _seal_buffer(self):
+        if self._buffer:
+            self._pending.append(bytes(self._buffer))
+            del self._buffer[:]
+
+    def _write_buffer(self):
+        if self._flush_thread is not None:
+            if self._buffer:
+                # the buffer is handed to the drain thread, a fresh
+                # one is used for subsequent appends
+                self._pending.append(self._buffer)
+                self._buffer = bytearray()
+            if self._pending:
+                with self._queue_condition:
+                    self._flush_queue.append(self._pending)
+                    self._queue_condition.notify_all()
+                self._pending = []
+                self._pending_size = 0
+            return
+        # seal the buffer with a copy before the write-out; if
+        # _write_buffers raises and the caller retries, the pending
+        # list still holds every byte exactly once instead of
+        # re-appending the live buffer a second time
+        self._seal_buffer()
+        buffers = self._pending
+        if not buffers:
+            return
+        self._write_buffers(buffers)
+        self._pending = []
+        self._pending_size = 0
+
+    def _write_buffers(self, buffers: List[bytes]):
+        # appends bypass the buffered file object, make sure no
+        # buffered write from elsewhere can be reordered behind them
+        self.file.flush()
+        file_descriptor = self.file.fileno()
+        if len(buffers) == 1:
+            _write_all(file_descriptor, buffers[0])
+        else:
+            _writev_all(file_descriptor, buffers)
+
+    def _drain_loop(self):
+        condition = self._queue_condition
+        queue = self._flush_queue
+        while True:
+            with condition:
+                while not queue:
+                    condition.wait()
+                buffers = []
+                while queue:
+                    buffers.extend(queue.popleft())
+                self._in_flight = True
+            try:
+                self._write_buffers(buffers)
+            except Exception as exception:
+                # record the error for re-raising in the caller
+                # thread and stop draining; waiters are woken by the
+                # finally clause and see the dead thread
+                self._flush_error = exception
+                return
+            finally:
+                with condition:
+                    self._in_flight = False
+                    condition.notify_all()
+
+    def _sync(self):
+        """
+        Make all appended content visible to reads.
+
+        Pending buffers are queued for write-out and, in deferred
+        mode, the drain thread is awaited. A write error that killed
+        the drain thread is re-raised here, so no read or flush can
+        report success after content was lost.
+        """
+        self._write_buffer()
+        if self._flush_thread is not None:
+            with self._queue_condition:
+                while self._flush_queue or self._in_flight:
+                    if self._flush_error is not None \
+                            or not self._flush_thread.is_alive():
+                        break
+                    # the timeout only guards against a missed
+                    # wakeup from an abnormally ended drain thread
+                    self._queue_condition.wait(timeout=0.1)
+            if self._flush_error is not None:
+                raise self._flush_error
+
+    @staticmethod
+    def _encode(content: bytes) -> bytes:
+        compressed = lz4frame.compress(content)
+        if len(compressed) < len(content):
+            return b"\x01" + compressed
+        return b"\x00" + bytes(content)
+
+    @staticmethod
+    def _decode(stored) -> Union[bytes, memoryview]:
+        if stored[0] == 1:
+            return lz4frame.decompress(stored[1:])
+        return stored[1:]
+
+    def append_content(self, content: bytes) -> Tuple[int, int]:
+        if self.compress:
+            content = self._encode(content)
+        offset = self.offset
+        size = len(content)
+        if size >= self.iovec_threshold:
+            self._seal_buffer()
+            self._pending.append(bytes(content))
+        else:
+            self._buffer += content
+        self._pending_size += size
+        self.offset += size
+        if self._pending_size >= self.soft_buffer_limit:
+            self._write_buffer()
+        return offset, size
+
+    def _remap(self):
+        """
+        Map the current extent of the storage file for reading.
+
+        The old map is only dropped, not closed: earlier reads may
+        still hold zero-copy views into it, and the map is released
+        when the last view disappears.
+        """
+        self.file.flush()
+        if os.fstat(self.file.fileno()).st_size > 0:
+            self._mapped = mmap.mmap(
+                self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_content(self,
+                     offset: int,
+                     size: int) -> Union[bytes, memoryview]:
+        self._sync()
+        end = offset + size
+        mapped = self._mapped
+        if mapped is None or end > len(mapped):
+            self._remap()
+            mapped = self._mapped
+        if mapped is not None and end <= len(mapped):
+            stored = memoryview(mapped)[offset:end]
+        else:
+            self.file.seek(offset)
+            stored = self.file.read(size)
+        if self.compress:
+            return self._decode(stored)
+        return stored
+
+    def byte_iterator(self, offset: int, size: int) -> Iterator[int]:
+        for byte_value in self.read_content(offset, size):
+            yield byte_value
+
+    def write_content(self,
+                      offset: int,
+                      max_size: int,
+                      content: bytes) -> Optional[Tuple[int, int]]:
+        stored = self._encode(content) if self.compress else content
+        size = len(stored)
+        if size > max_size:
+            return None
+        self._sync()
+        if self._write_fd is None:
+            # the append handle carries O_APPEND, which forces all
+            # writes to the file end; positional rewrites go through
+            # a separate descriptor
+            self._write_fd = os.open(self.file_name, os.O_RDWR)
+        os.pwrite(self._write_fd, stored, offset)
+        return offset, size
+
+    def append_many(self,
+                    contents: List[bytes]) -> List[Tuple[int, int]]:
+        if self.compress:
+            contents = [self._encode(content) for content in contents]
+        offset = self.offset
+        regions = []
+        buffer = self._buffer
+        pending = self._pending
+        threshold = self.iovec_threshold
+        for content in contents:
+            size = len(content)
+            regions.append((offset, size))
+            offset += size
+            if size >= threshold:
+                self._seal_buffer()
+                pending.append(bytes(content))
+            else:
+                buffer += content
+        self._pending_size += offset - self.offset
+        self.offset = offset
+        if self._pending_size >= self.soft_buffer_limit:
+            self._write_buffer()
+        return regions
+
+    def read_many(
+            self,
+            regions: List[Tuple[int, int]],
+    ) -> Iterator[Union[bytes, memoryview]]:
+        """
+        Read multiple regions as views into the mapped storage file.
+
+        Every region becomes a zero-copy slice of the map, a full
+        scan issues no read syscalls at all. If the file cannot be
+        mapped the regions are read with a single file-position walk
+        that skips seeks between adjacent regions.
+        """
+        self._sync()
+        if regions:
+            last_end = max(offset + size for offset, size in regions)
+            mapped = self._mapped
+            if mapped is None or last_end > len(mapped):
+                self._remap()
+                mapped = self._mapped
+            if mapped is not None and last_end <= len(mapped):
+                view = memoryview(mapped)
+                if self.compress:
+                    decode = self._decode
+                    for offset, size in self._prefetched(regions):
+                        yield decode(view[offset:offset + size])
+                else:
+                    for offset, size in self._prefetched(regions):
+                        yield view[offset:offset + size]
+                return
+        position = -1
+        for offset, size in regions:
+            if offset != position:
+                self.file.seek(offset)
+            content = self.file.read(size)
+            position = offset + len(content)
+            yield self._decode(content) if self.compress else content
+
+    def _prefetched(
+            self,
+            regions: List[Tuple[int, int]],
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Yield regions and ask the kernel for the pages of the next
+        window while the current window is being consumed, so page-in
+        overlaps with the per-region work of the caller.
+        """
+        fadvise = getattr(os, "posix_fadvise", None)
+        window = self.prefetch_window
+        if fadvise is None or len(regions) <= window:
+            yield from regions
+            return
+        file_descriptor = self.file.fileno()
+        for window_start in range(0, len(regions), window):
+            upcoming = regions[
+                window_start + window:window_start + 2 * window]
+            if upcoming:
+                begin = min(offset for offset, _ in upcoming)
+                end = max(offset + size for offset, size in upcoming)
+                fadvise(
+                    file_descriptor, begin, end - begin,
+                    os.POSIX_FADV_WILLNEED)
+            yield from regions[window_start:window_start + window]
+
+    def advise_sequential(self):
+        self._sync()
+        if self._mapped is None:
+            self._remap()
+        if self._mapped is not None \
+                and hasattr(mmap, "MADV_SEQUENTIAL"):
+            # let the kernel read ahead aggressively and drop pages
+            # behind the scan instead of caching them
+            self._mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+    def flush(self):
+        self._sync()
+        self.file.flush()
+        # fdatasync is sufficient here: the file size is part of the
+        # data that has to be persisted for appended content, and
+        # skipping the remaining metadata saves one journal commit
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self.file.fileno())
+        else:
+            os.fsync(self.file.fileno())
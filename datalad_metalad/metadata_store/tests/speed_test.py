@@ -0,0 +1,66 @@
+"""
+Simple speed test for index creation, joining and flushing.
+
+Not executed as part of the test suite, run it manually, e.g.:
+
+   python -m datalad_metalad.metadata_store.tests.speed_test 1000000
+"""
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+from ..simple_file_index import SimpleFileIndex
+from ..storage_backend import FileStorageBackend
+
+
+batch_size = 1024
+
+
+def fill_index(index: SimpleFileIndex, side: str, entries: int):
+    # the content prefix is encoded once; the per-entry payload is
+    # built with C-level %-formatting on bytes, which avoids the
+    # f-string format, encode and bytearray construction per entry
+    # bind the loop invariants to locals, the loop body then only
+    # uses LOAD_FAST instead of repeated attribute lookups
+    prefix = side.encode("utf-8") + b" #"
+    bulk_add = index.bulk_add
+    for batch_start in range(0, entries, batch_size):
+        bulk_add(
+            "ng_file",
+            [
+                (f"/e{i}", prefix + b"%d" % i)
+                for i in range(
+                    batch_start, min(batch_start + batch_size, entries))
+            ])
+
+
+def speed_test(entries: int):
+    with TemporaryDirectory() as left_dir, \
+            TemporaryDirectory() as right_dir, \
+            TemporaryDirectory() as joined_dir:
+
+        start_time = time.time()
+        lios = SimpleFileIndex(left_dir, FileStorageBackend)
+        fill_index(lios, "left", entries)
+
+        rios = SimpleFileIndex(right_dir, FileStorageBackend)
+        fill_index(rios, "right", entries)
+        create_time = time.time()
+
+        joined = SimpleFileIndex.join(
+            joined_dir, FileStorageBackend,
+            "/left", lios,
+            "/right", rios)
+        combine_time = time.time()
+
+        joined.flush()
+        flush_time = time.time()
+
+        print(f"entries: {2 * entries}")
+        print(f"create time: {create_time - start_time}")
+        print(f"combine time: {combine_time - create_time}")
+        print(f"flush time: {flush_time - combine_time}")
+
+
+if __name__ == "__main__":
+    speed_test(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+
+from ..simple_file_index import SimpleFileIndex
+from ..storage_backend import DummyStorageBackend
+
+
+class TestJoin(unittest.TestCase):
+    entries = 10
+
+    def setUp(self) -> None:
+        self.left_dir = tempfile.TemporaryDirectory()
+        self.right_dir = tempfile.TemporaryDirectory()
+        self.joined_dir = tempfile.TemporaryDirectory()
+
+        self.left = SimpleFileIndex(self.left_dir.name, DummyStorageBackend)
+        self.right = SimpleFileIndex(self.right_dir.name, DummyStorageBackend)
+        for i in range(self.entries):
+            self.left.add_path(f"/e{i}")
+            self.left.add_metadata_to_path(
+                f"/e{i}", "ng_file", f"left #{i}".encode())
+            self.right.add_path(f"/e{i}")
+            self.right.add_metadata_to_path(
+                f"/e{i}", "ng_file", f"right #{i}".encode())
+
+    def tearDown(self) -> None:
+        self.left_dir.cleanup()
+        self.right_dir.cleanup()
+        self.joined_dir.cleanup()
+
+    def test_join(self):
+        joined = SimpleFileIndex.join(
+            self.joined_dir.name, DummyStorageBackend,
+            "/left", self.left,
+            "/right", self.right)
+
+        self.assertEqual(len(joined), 2 * self.entries)
+        for i in range(self.entries):
+            self.assertEqual(
+                joined.get_metadata(f"/left/e{i}", "ng_file"),
+                f"left #{i}".encode())
+            self.assertEqual(
+                joined.get_metadata(f"/right/e{i}", "ng_file"),
+                f"right #{i}".encode())
+
+    def test_join_duplicated_paths(self):
+        self.assertRaises(
+            KeyError,
+            SimpleFileIndex.join,
+            self.joined_dir.name, DummyStorageBackend,
+            "/same", self.left,
+            "/same", self.right)
+
+    def test_join_duplicated_paths_same_side(self):
+        # "x" and "/x" join to the same path; this must be detected
+        # even with disjoint prefixes
+        self.left.add_path("x")
+        self.left.add_path("/x")
+        self.assertRaises(
+            KeyError,
+            SimpleFileIndex.join,
+            self.joined_dir.name, DummyStorageBackend,
+            "/left", self.left,
+            "/right", self.right)
+
+    def test_join_paths(self):
+        self.assertEqual(
+            SimpleFileIndex.join_paths("/left/", "/e1"),
+            "/left/e1")
+        self.assertEqual(
+            SimpleFileIndex.join_paths("/left", "e1"),
+            "/left/e1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import unittest
+
+from ..simple_file_index import SimpleFileIndex
+from ..storage_backend import FileStorageBackend
+from ..tools import readngmd
+from ..tools.readngmd import msgpack
+
+
+class TestReadNgMd(unittest.TestCase):
+    def create_store(self, base_dir_name: str):
+        metadata_store = SimpleFileIndex(base_dir_name, FileStorageBackend)
+        metadata_store.add_path("/d1", is_dataset=True)
+        metadata_store.add_metadata_to_path(
+            "/d1", "ng_dataset", b"multi-byte metadata content")
+        metadata_store.add_path("/f1")
+        metadata_store.add_metadata_to_path(
+            "/f1", "ng_file", b"file metadata")
+        metadata_store.flush()
+
+    def run_main(self, argv, stdin_text=None):
+        # a text wrapper over BytesIO provides the .buffer attribute
+        # that the binary output paths write to
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        old_stdin = sys.stdin
+        if stdin_text is not None:
+            sys.stdin = io.StringIO(stdin_text)
+        try:
+            with contextlib.redirect_stdout(stdout):
+                result = readngmd.main(argv)
+        finally:
+            sys.stdin = old_stdin
+        stdout.flush()
+        return result, stdout.buffer.getvalue().decode("utf-8")
+
+    def test_full_content_is_shown(self):
+        # regression test: content display must not be truncated to
+        # the first byte of each entry
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_store(temp_dir)
+            result, output = self.run_main(["-s", temp_dir])
+            self.assertEqual(result, 0)
+            self.assertIn(
+                "  content: multi-byte metadata content", output)
+
+    def test_plain_listing(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_store(temp_dir)
+            result, output = self.run_main([temp_dir])
+            self.assertEqual(result, 0)
+            self.assertIn("# path entries: 2", output)
+            self.assertIn('"/d1": (dataset root)\n  metadata: ng_dataset',
+                          output)
+            self.assertIn('"/f1":\n  metadata: ng_file', output)
+            self.assertNotIn("content", output)
+
+    def test_limit(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_store(temp_dir)
+            result, output = self.run_main(["--limit", "1", temp_dir])
+            self.assertEqual(result, 0)
+            self.assertEqual(output.count("  metadata: "), 1)
+            result, output = self.run_main(["-s", "--limit", "1", temp_dir])
+            self.assertEqual(result, 0)
+            self.assertEqual(output.count("  content: "), 1)
+
+    def test_jsonl_output(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_store(temp_dir)
+            result, output = self.run_main(
+                ["--format", "jsonl", "-s", temp_dir])
+            self.assertEqual(result, 0)
+            rows = [json.loads(line) for line in output.splitlines()]
+            self.assertEqual(len(rows), 2)
+            self.assertIn(
+                {"path": "/d1", "fmt": "ng_dataset", "dataset": True,
+                 "content": "multi-byte metadata content"},
+                rows)
+
+    @unittest.skipIf(msgpack is None, "requires the msgpack package")
+    def test_msgpack_output(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_store(temp_dir)
+            stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+            with contextlib.redirect_stdout(stdout):
+                result = readngmd.main(["--format", "msgpack", "-s", temp_dir])
+            self.assertEqual(result, 0)
+            rows = list(msgpack.Unpacker(
+                io.BytesIO(stdout.buffer.getvalue()), raw=False))
+            self.assertEqual(len(rows), 2)
+            self.assertIn(
+                {"path": "/f1", "fmt": "ng_file", "dataset": False,
+                 "content": b"file metadata"},
+                rows)
+
+    def test_repl(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.create_store(temp_dir)
+            result, output = self.run_main(
+                ["--repl", temp_dir],
+                stdin_text="count\nlist\nshow /f1\nlist [\nquit\n")
+            self.assertEqual(result, 0)
+            self.assertIn("2\n", output)
+            self.assertIn("/d1\n/f1\n", output)
+            self.assertIn("ng_file: file metadata", output)
+            self.assertIn("error: invalid pattern", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
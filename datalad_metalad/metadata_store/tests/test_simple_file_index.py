@@ -0,0 +1,228 @@
+import tempfile
+import unittest
+from typing import List
+
+from ..simple_file_index import SimpleFileIndex
+from ..storage_backend import (
+    DummyStorageBackend,
+    FileStorageBackend,
+)
+
+
+class TestSimpleFileIndex(unittest.TestCase):
+    @staticmethod
+    def get_content_objects(number: int,
+                            length: int = 3) -> List[memoryview]:
+        # one contiguous blob instead of one bytearray per entry;
+        # the content objects are zero-copy views into it
+        blob = bytes(
+            value
+            for start in range(number)
+            for value in range(start, start + length)
+        )
+        view = memoryview(blob)
+        return [
+            view[start * length:(start + 1) * length]
+            for start in range(number)
+        ]
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.sfi = SimpleFileIndex(self.temp_dir.name, DummyStorageBackend)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def add_contents(self, number: int, length: int = 3):
+        for index, content in enumerate(
+                self.get_content_objects(number, length)):
+            self.sfi.add_content(f"a{index}", content)
+
+    def test_add_content(self):
+        self.add_contents(5)
+        self.assertEqual(len(self.sfi), 5)
+        self.assertEqual(self.sfi.paths[b"a3"].content_offset, 9)
+        self.assertEqual(self.sfi.paths[b"a3"].size, 3)
+        self.assertEqual(self.sfi.get_content("a3"), bytes([3, 4, 5]))
+
+    def test_add_duplicated_path(self):
+        self.sfi.add_path("a1")
+        self.assertRaises(KeyError, self.sfi.add_path, "a1")
+
+    def test_add_metadata(self):
+        self.sfi.add_path("d1", is_dataset=True)
+        self.sfi.add_metadata_to_path("d1", "ng_dataset", b"some metadata")
+        self.assertEqual(
+            self.sfi.get_metadata("d1", "ng_dataset"),
+            b"some metadata")
+        self.assertEqual(
+            self.sfi.get_metadata_formats("d1"),
+            ["ng_dataset"])
+        self.assertRaises(
+            KeyError,
+            self.sfi.add_metadata_to_path, "d1", "ng_dataset", b"x")
+
+    def test_add_metadata_unchecked(self):
+        self.sfi.add_metadata_to_path(
+            "a1", "ng_file", b"content", unchecked=True)
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"),
+            b"content")
+        self.sfi.add_metadata_to_path(
+            "a1", "ng_file", b"new content", unchecked=True)
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"),
+            b"new content")
+
+    def test_add_metadata_many(self):
+        self.sfi.add_path("a1")
+        self.sfi.add_path("a2")
+        self.sfi.add_metadata_many([
+            ("a1", "ng_file", b"content 1"),
+            ("a2", "ng_file", b"content 2"),
+        ])
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"), b"content 1")
+        self.assertEqual(
+            self.sfi.get_metadata("a2", "ng_file"), b"content 2")
+        self.assertRaises(
+            KeyError,
+            self.sfi.add_metadata_many,
+            [("a1", "ng_file", b"duplicate")])
+        self.assertRaises(
+            KeyError,
+            self.sfi.add_metadata_many,
+            [("a1", "other", b"x"), ("a1", "other", b"y")])
+
+    def test_add_content_many(self):
+        self.sfi.add_content_many([("a1", b"c1"), ("a2", b"c2")])
+        self.assertEqual(self.sfi.get_content("a1"), b"c1")
+        self.assertEqual(self.sfi.get_content("a2"), b"c2")
+        self.assertRaises(
+            KeyError,
+            self.sfi.add_content_many, [("a2", b"x")])
+        self.assertRaises(
+            KeyError,
+            self.sfi.add_content_many, [("a3", b"x"), ("a3", b"y")])
+
+    def test_bulk_add(self):
+        self.sfi.add_path("a1", is_dataset=True)
+        self.sfi.bulk_add(
+            "ng_file",
+            [("a1", b"content 1"), ("a2", b"content 2")])
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"), b"content 1")
+        self.assertEqual(
+            self.sfi.get_metadata("a2", "ng_file"), b"content 2")
+        self.assertTrue(self.sfi.paths[b"a1"].is_dataset)
+
+    def test_delete_path(self):
+        self.add_contents(3)
+        self.sfi.delete_path("a1")
+        self.assertNotIn("a1", self.sfi)
+        self.assertEqual(len(self.sfi.deleted_regions), 1)
+        self.assertEqual(self.sfi.deleted_regions[0].content_offset, 3)
+        self.assertEqual(self.sfi.deleted_regions[0].size, 3)
+
+    def test_replace_metadata(self):
+        self.sfi.add_path("a1")
+        self.sfi.add_metadata_to_path("a1", "ng_file", b"old content")
+        self.sfi.replace_metadata_at_path("a1", "ng_file", b"new content")
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"),
+            b"new content")
+        # content of the same size is rewritten in place
+        self.assertEqual(len(self.sfi.deleted_regions), 0)
+        self.sfi.replace_metadata_at_path(
+            "a1", "ng_file", b"a considerably longer content")
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"),
+            b"a considerably longer content")
+        self.assertEqual(len(self.sfi.deleted_regions), 1)
+        self.assertEqual(
+            self.sfi.deleted_regions[0].size,
+            len(b"new content"))
+
+    def test_replace_reuses_free_region(self):
+        self.sfi.add_content("a0", b"0123456789")
+        self.sfi.add_path("a1")
+        self.sfi.add_metadata_to_path("a1", "ng_file", b"xy")
+        self.sfi.delete_path("a0")
+        self.sfi.replace_metadata_at_path("a1", "ng_file", b"abcdefgh")
+        self.assertEqual(
+            self.sfi.get_metadata("a1", "ng_file"), b"abcdefgh")
+        # the new content went into the freed region at offset 0,
+        # only its remainder stays deleted
+        self.assertEqual(len(self.sfi.deleted_regions), 1)
+        self.assertEqual(self.sfi.deleted_regions[0].content_offset, 8)
+        self.assertEqual(self.sfi.deleted_regions[0].size, 4)
+
+    def test_delete_empty_content_ignored(self):
+        # deleting empty content must not record a zero-size region;
+        # such regions defeat the adjacency merge and can end up
+        # inside merged regions
+        self.sfi.add_path("a1")
+        self.sfi.add_metadata_to_path("a1", "ng_file", b"")
+        self.sfi.add_content("a2", b"abc")
+        self.sfi.delete_metadata_from_path("a1", "ng_file")
+        self.assertEqual(len(self.sfi.deleted_regions), 0)
+        self.sfi.delete_path("a2")
+        self.assertEqual(len(self.sfi.deleted_regions), 1)
+        self.assertEqual(self.sfi.deleted_regions[0].size, 3)
+
+    def test_delete_merges_adjacent_regions(self):
+        self.add_contents(3)
+        self.sfi.delete_path("a0")
+        self.sfi.delete_path("a2")
+        self.assertEqual(len(self.sfi.deleted_regions), 2)
+        self.sfi.delete_path("a1")
+        self.assertEqual(len(self.sfi.deleted_regions), 1)
+        self.assertEqual(self.sfi.deleted_regions[0].content_offset, 0)
+        self.assertEqual(self.sfi.deleted_regions[0].size, 9)
+
+    def test_get_paths_pattern(self):
+        self.add_contents(4)
+        self.assertEqual(
+            sorted(self.sfi.get_paths("a[12]")),
+            ["a1", "a2"])
+
+    def test_get_paths_prefix(self):
+        self.add_contents(3)
+        self.sfi.add_content("b0", b"xyz")
+        self.assertEqual(
+            sorted(self.sfi.get_paths("a")),
+            ["a0", "a1", "a2"])
+
+    def test_iterate(self):
+        self.sfi.add_path("a1")
+        self.sfi.add_metadata_to_path("a1", "ng_file", b"c1")
+        entries = list(self.sfi)
+        self.assertEqual(len(entries), 1)
+        path, is_dataset, metadata_format, reader = entries[0]
+        self.assertEqual(path, "a1")
+        self.assertFalse(is_dataset)
+        self.assertEqual(metadata_format, "ng_file")
+        self.assertEqual(bytes(reader), b"c1")
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as file_store_dir:
+            sfi = SimpleFileIndex(file_store_dir, FileStorageBackend)
+            sfi.add_path("d1", is_dataset=True)
+            sfi.add_metadata_to_path("d1", "ng_dataset", b"dataset metadata")
+            sfi.add_content("f1", b"file content")
+            sfi.delete_path("f1")
+            sfi.flush()
+
+            sfi_reread = SimpleFileIndex(file_store_dir, FileStorageBackend)
+            self.assertEqual(
+                sfi_reread.get_metadata("d1", "ng_dataset"),
+                b"dataset metadata")
+            self.assertTrue(sfi_reread.paths[b"d1"].is_dataset)
+            self.assertEqual(len(sfi_reread.deleted_regions), 1)
+            self.assertEqual(
+                sfi_reread.deleted_regions[0].size,
+                len(b"file content"))
+
+
+if __name__ == '__main__':
+    unittest.main()
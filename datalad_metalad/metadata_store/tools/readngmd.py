@@ -0,0 +1,272 @@
+"""
+Read the content of a next-generation metadata store and
+print its entries to stdout.
+"""
+import json
+import re
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from itertools import (
+    chain,
+    islice,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from ..simple_file_index import SimpleFileIndex
+from ..storage_backend import FileStorageBackend
+
+
+# flush the accumulated output whenever it exceeds this size
+output_chunk_size = 64 * 1024
+
+# number of overlapping content reads in --show-metadata-content mode
+read_worker_count = 16
+
+# number of entries handed to the read workers at once; bounds the
+# entries that are in flight, and with them the peak memory of a scan
+read_batch_size = 64
+
+
+PARSER = ArgumentParser(
+    description="read the content of a ng metadata store")
+PARSER.add_argument(
+    "metadata_store",
+    type=str,
+    help="the directory that contains the metadata store")
+PARSER.add_argument(
+    "-s", "--show-metadata-content",
+    action="store_true",
+    default=False,
+    help="show the stored metadata content of every entry")
+PARSER.add_argument(
+    "--format",
+    choices=("human", "jsonl", "msgpack"),
+    default="human",
+    help="output format; 'jsonl' and 'msgpack' write one compact "
+         "machine-readable record per entry")
+PARSER.add_argument(
+    "--limit",
+    type=int,
+    default=None,
+    metavar="N",
+    help="only show the first N entries")
+PARSER.add_argument(
+    "--repl",
+    action="store_true",
+    default=False,
+    help="keep the metadata store open and serve the commands "
+         "'list', 'show <path>', 'count' and 'quit' from stdin")
+
+
+def create_metadata_store(arguments) -> SimpleFileIndex:
+    metadata_store = SimpleFileIndex(
+        arguments.metadata_store, FileStorageBackend)
+    metadata_store.preload_index()
+    return metadata_store
+
+
+def write_lines(lines) -> None:
+    """
+    Write the given lines to stdout in chunks of about
+    output_chunk_size bytes instead of one write per line.
+    """
+    write = sys.stdout.write
+    pending = []
+    pending_size = 0
+    for line in lines:
+        pending.append(line)
+        pending_size += len(line) + 1
+        if pending_size >= output_chunk_size:
+            write("\n".join(pending) + "\n")
+            pending.clear()
+            pending_size = 0
+    if pending:
+        write("\n".join(pending) + "\n")
+    sys.stdout.flush()
+
+
+def fetch_entry(entry):
+    """
+    Materialize the content of one index entry.
+
+    This runs in a worker thread; the byte copy out of the backend's
+    mmap releases the GIL during page faults, so reads of several
+    entries overlap.
+    """
+    path, is_dataset, metadata_format, reader = entry
+    return path, is_dataset, metadata_format, bytes(reader)
+
+
+def fetch_entries(metadata_store: SimpleFileIndex, limit):
+    """
+    Yield index entries with materialized content.
+
+    Reads overlap in a thread pool, but only one batch of entries is
+    in flight at a time, so the peak memory of a scan stays bounded
+    regardless of the store size. Entry order is preserved.
+    """
+    entries = iter(metadata_store)
+    if limit is not None:
+        entries = islice(entries, limit)
+    with ThreadPoolExecutor(max_workers=read_worker_count) as executor:
+        while True:
+            batch = list(islice(entries, read_batch_size))
+            if not batch:
+                return
+            yield from executor.map(fetch_entry, batch)
+
+
+def write_packed(metadata_store: SimpleFileIndex, arguments) -> int:
+    """
+    Write one compact record per entry, packed as JSON lines or
+    msgpack, through the binary stdout layer.
+    """
+    if arguments.format == "msgpack":
+        if msgpack is None:
+            PARSER.error("--format msgpack requires the msgpack package")
+        pack = msgpack.packb
+
+        def decode_content(reader):
+            return bytes(reader)
+    else:
+        if orjson is not None:
+            def pack(row):
+                return orjson.dumps(row) + b"\n"
+        else:
+            def pack(row, _dumps=json.dumps):
+                return _dumps(row, separators=(",", ":")).encode(
+                    "utf-8") + b"\n"
+
+        def decode_content(reader):
+            return bytes(reader).decode("utf-8", "replace")
+
+    stdout_buffer = sys.stdout.buffer
+    if arguments.show_metadata_content:
+        entries = iter(metadata_store)
+        if arguments.limit is not None:
+            entries = islice(entries, arguments.limit)
+        stdout_buffer.writelines(
+            pack({
+                "path": path,
+                "fmt": metadata_format,
+                "dataset": is_dataset,
+                "content": decode_content(reader)})
+            for path, is_dataset, metadata_format, reader in entries)
+    else:
+        paths, is_dataset, metadata_formats, _, _ = \
+            metadata_store.columns()
+        entries = zip(paths, is_dataset, metadata_formats)
+        if arguments.limit is not None:
+            entries = islice(entries, arguments.limit)
+        stdout_buffer.writelines(
+            pack({
+                "path": path,
+                "fmt": metadata_format,
+                "dataset": path_is_dataset})
+            for path, path_is_dataset, metadata_format in entries)
+    stdout_buffer.flush()
+    return 0
+
+
+def run_repl(metadata_store: SimpleFileIndex) -> int:
+    """
+    Serve queries against a metadata store that stays open, so that
+    repeated queries do not pay the index-load cost of one readngmd
+    invocation each.
+    """
+    for line in sys.stdin:
+        command, _, argument = line.strip().partition(" ")
+        if command in ("quit", "exit", ""):
+            if command:
+                break
+            continue
+        if command == "count":
+            print(len(metadata_store))
+        elif command == "list":
+            try:
+                write_lines(metadata_store.get_paths(argument or None))
+            except re.error as pattern_error:
+                print(f"error: invalid pattern: {pattern_error}")
+        elif command == "show":
+            try:
+                for metadata_format in \
+                        metadata_store.get_metadata_formats(argument):
+                    content = metadata_store.get_metadata(
+                        argument, metadata_format)
+                    print(f"{metadata_format}: "
+                          + bytes(content).decode("utf-8", "replace"))
+            except KeyError:
+                print(f"error: unknown path: {argument}")
+        else:
+            print(f"error: unknown command: {command}")
+        sys.stdout.flush()
+    return 0
+
+
+def main(argv=None) -> int:
+    arguments = PARSER.parse_args(argv)
+    metadata_store = create_metadata_store(arguments)
+
+    if arguments.repl:
+        return run_repl(metadata_store)
+
+    if arguments.format != "human":
+        return write_packed(metadata_store, arguments)
+
+    if not arguments.show_metadata_content:
+        # the listing does not need any content, build pre-encoded
+        # rows from the entry columns and hand them to the binary
+        # stdout layer; writelines() bypasses the per-row
+        # TextIOWrapper encoding step
+        paths, is_dataset, metadata_formats, _, _ = \
+            metadata_store.columns()
+        entries = zip(paths, is_dataset, metadata_formats)
+        if arguments.limit is not None:
+            entries = islice(entries, arguments.limit)
+        # the fixed row pieces are encoded once; each row only
+        # appends byte slices to a shared buffer instead of running
+        # an f-string plus encode per row
+        quote = b'"'
+        dataset_suffix = b'": (dataset root)\n  metadata: '
+        plain_suffix = b'":\n  metadata: '
+        newline = b"\n"
+        stdout_buffer = sys.stdout.buffer
+        out_buffer = bytearray(
+            f"# path entries: {len(metadata_store)}\n".encode("utf-8"))
+        for path, path_is_dataset, metadata_format in entries:
+            out_buffer += quote
+            out_buffer += path.encode("utf-8")
+            out_buffer += dataset_suffix if path_is_dataset else plain_suffix
+            out_buffer += metadata_format.encode("utf-8")
+            out_buffer += newline
+            if len(out_buffer) >= output_chunk_size:
+                stdout_buffer.write(out_buffer)
+                del out_buffer[:]
+        if out_buffer:
+            stdout_buffer.write(out_buffer)
+        stdout_buffer.flush()
+        return 0
+
+    write_lines(chain(
+        [f"# path entries: {len(metadata_store)}"],
+        (f'"{path}":'
+         + (" (dataset root)" if is_dataset else "")
+         + f"\n  metadata: {metadata_format}"
+         + f"\n  content: {content.decode('utf-8', 'replace')}"
+         for path, is_dataset, metadata_format, content
+         in fetch_entries(metadata_store, arguments.limit))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
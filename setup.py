@@ -47,24 +47,5 @@ setup(
         'datalad-metadata-model',
         'pyyaml'
     ],
-    entry_points={
-        'datalad.extensions': [
-            'metalad=datalad_metalad:command_suite',
-        ],
-        'datalad.tests': [
-            'metalad=datalad_metalad'
-        ],
-        'datalad.metadata.extractors': [
-            'metalad_core=datalad_metalad.extractors.core:DataladCoreExtractor',
-            'metalad_core_dataset=datalad_metalad.extractors.core_dataset:DataladCoreDatasetExtractor',
-            'metalad_core_file=datalad_metalad.extractors.core_file:DataladCoreFileExtractor',
-            'metalad_annex=datalad_metalad.extractors.annex:AnnexMetadataExtractor',
-            'metalad_custom=datalad_metalad.extractors.custom:CustomMetadataExtractor',
-            'metalad_runprov=datalad_metalad.extractors.runprov:RunProvenanceExtractor',
-            'metalad_studyminimeta=datalad_metalad.extractors.studyminimeta.main:StudyMiniMetaExtractor',
-        ],
-        'datalad.metadata.indexers': [
-            'metalad_studyminimeta=datalad_metalad.indexers.studyminimeta:StudyMiniMetaIndexer',
-        ]
-    },
+    # entry points are declared in setup.cfg
 )